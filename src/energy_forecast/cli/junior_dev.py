@@ -1,5 +1,7 @@
 from __future__ import annotations
 
+from concurrent.futures import ThreadPoolExecutor
+import os
 import subprocess
 import sys
 
@@ -9,14 +11,39 @@ def _run(cmd: list[str]) -> int:
     return result.returncode
 
 
+def _run_captured(
+    cmd: list[str], env: dict[str, str]
+) -> subprocess.CompletedProcess[str]:
+    return subprocess.run(cmd, capture_output=True, text=True, env=env)
+
+
+def _run_parallel(cmds: list[list[str]]) -> list[int]:
+    env = dict(os.environ)
+    if sys.stdout.isatty():
+        # Captured output is not a TTY, so ask the tools to keep their colours.
+        env.setdefault("FORCE_COLOR", "1")
+        env.setdefault("CLICOLOR_FORCE", "1")
+    # Each tool's output is replayed in step order once it has finished, so the
+    # two never interleave.
+    codes = []
+    with ThreadPoolExecutor(max_workers=len(cmds)) as pool:
+        for result in pool.map(lambda cmd: _run_captured(cmd, env), cmds):
+            sys.stdout.write(result.stdout)
+            sys.stderr.write(result.stderr)
+            codes.append(result.returncode)
+    return codes
+
+
 def main() -> None:
-    steps = [
+    # Format first, as before; the read-only checks then overlap.
+    code = _run(["black", "."])
+    if code != 0:
+        sys.exit(code)
+    checks = [
         ["ruff", "check", "."],
-        ["black", "."],
         ["ty", "check", "src", "tests"],
     ]
-    for step in steps:
-        code = _run(step)
+    for code in _run_parallel(checks):
         if code != 0:
             sys.exit(code)
 
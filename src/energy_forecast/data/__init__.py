@@ -0,0 +1,2 @@
+# Kept free of third-party imports so the CLI can read it without loading dlt.
+MAX_FETCH_WORKERS = 16
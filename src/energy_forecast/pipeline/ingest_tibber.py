@@ -1,14 +1,24 @@
 from __future__ import annotations
 
 import argparse
+from contextlib import contextmanager
+from dataclasses import dataclass
+from functools import lru_cache, partial
 import os
+from time import monotonic
+from typing import TYPE_CHECKING, Iterator, Sequence
+from weakref import WeakKeyDictionary
 
-import dlt
-from dotenv import load_dotenv
-import psycopg2
-from psycopg2 import sql
+from energy_forecast.data import MAX_FETCH_WORKERS
 
-from energy_forecast.data.tibber_source import tibber_source
+# dlt, psycopg2 and dotenv are imported where they are used so that --help and
+# argument errors do not pay for loading them.
+if TYPE_CHECKING:
+    import psycopg2.extensions
+    from psycopg2.pool import ThreadedConnectionPool
+
+
+_REQUIRED_ENV = ("TIBBER_TOKEN", "TIBBER_HOME_ID", "SUPABASE_DATABASE_URL")
 
 
 def _env(name: str) -> str:
@@ -18,118 +28,314 @@ def _env(name: str) -> str:
     return value
 
 
+def _validate_env() -> None:
+    missing = [name for name in _REQUIRED_ENV if not os.getenv(name)]
+    if missing:
+        raise RuntimeError(f"Missing required env vars: {', '.join(missing)}")
+
+
+PIPELINE_NAME = "tibber"
+
+_POOLS: dict[str, ThreadedConnectionPool] = {}
+
+
+def _pool(conn_str: str) -> ThreadedConnectionPool:
+    pool = _POOLS.get(conn_str)
+    if pool is None:
+        from psycopg2.pool import ThreadedConnectionPool
+
+        pool = ThreadedConnectionPool(1, 4, conn_str)
+        _POOLS[conn_str] = pool
+    return pool
+
+
+# When each pooled connection was last handed back; weak so closed or discarded
+# connections drop out on their own.
+_RETURNED_AT: WeakKeyDictionary[psycopg2.extensions.connection, float] = (
+    WeakKeyDictionary()
+)
+# Connections reused sooner than this skip the liveness check, so back-to-back
+# helpers keep their round-trip savings.
+_IDLE_CHECK_SECONDS = 30.0
+
+
+def _checkout(pool: ThreadedConnectionPool) -> psycopg2.extensions.connection:
+    import psycopg2
+
+    conn = pool.getconn()
+    returned_at = _RETURNED_AT.pop(conn, None)
+    if not conn.closed:
+        # Helpers only run independent statements, so skip the extra BEGIN and
+        # COMMIT round-trips psycopg2 would otherwise add.
+        conn.autocommit = True
+        if returned_at is None or monotonic() - returned_at < _IDLE_CHECK_SECONDS:
+            return conn
+        # The server may have dropped a connection left idle, e.g. during a long
+        # load between --resume and the gap check.
+        try:
+            with conn.cursor() as cur:
+                cur.execute("select 1")
+            return conn
+        except (psycopg2.InterfaceError, psycopg2.OperationalError):
+            pass
+    pool.putconn(conn, close=True)
+    conn = pool.getconn()
+    conn.autocommit = True
+    return conn
+
+
+@contextmanager
+def _conn(conn_str: str) -> Iterator[psycopg2.extensions.connection]:
+    import psycopg2
+
+    pool = _pool(conn_str)
+    conn = _checkout(pool)
+    broken = False
+    try:
+        yield conn
+    except (psycopg2.InterfaceError, psycopg2.OperationalError):
+        broken = True
+        raise
+    finally:
+        close = broken or bool(conn.closed)
+        if not close:
+            _RETURNED_AT[conn] = monotonic()
+        pool.putconn(conn, close=close)
+
+
+def _close_pools() -> None:
+    for pool in _POOLS.values():
+        pool.closeall()
+    _POOLS.clear()
+    _RETURNED_AT.clear()
+
+
+def _env_bool(name: str) -> bool:
+    return os.getenv(name, "").lower() in {"1", "true", "yes"}
+
+
+@dataclass(frozen=True)
+class _Defaults:
+    last_hours: int
+    latest_hours: int
+    offset_hours: int
+    resume: bool
+    self_heal: bool
+    start: str | None
+    end: str | None
+    chunk_hours: int
+    fetch_workers: int
+    dataset: str
+
+
+@lru_cache(maxsize=1)
+def _defaults() -> _Defaults:
+    # Read once per process; call _defaults.cache_clear() after changing env.
+    return _Defaults(
+        last_hours=int(os.getenv("TIBBER_LAST_HOURS", "720")),
+        latest_hours=int(os.getenv("TIBBER_LATEST_HOURS", "0")),
+        offset_hours=int(os.getenv("TIBBER_OFFSET_HOURS", "0")),
+        resume=_env_bool("TIBBER_RESUME"),
+        self_heal=_env_bool("TIBBER_SELF_HEAL"),
+        start=os.getenv("TIBBER_START"),
+        end=os.getenv("TIBBER_END"),
+        chunk_hours=int(os.getenv("TIBBER_CHUNK_HOURS", "168")),
+        fetch_workers=int(os.getenv("TIBBER_FETCH_WORKERS", "4")),
+        dataset=os.getenv("DLT_DATASET", "raw"),
+    )
+
+
 def parse_args() -> argparse.Namespace:
+    defaults = _defaults()
     parser = argparse.ArgumentParser(
         description="Ingest Tibber consumption data to Supabase via dlt."
     )
     parser.add_argument(
         "--last-hours",
         type=int,
-        default=int(os.getenv("TIBBER_LAST_HOURS", "720")),
+        default=defaults.last_hours,
         help="How many recent hours to pull from Tibber (default: 720).",
     )
     parser.add_argument(
         "--latest-hours",
         type=int,
-        default=int(os.getenv("TIBBER_LATEST_HOURS", "0")),
+        default=defaults.latest_hours,
         help="Fetch a rolling window of the latest hours (e.g., 24).",
     )
     parser.add_argument(
         "--offset-hours",
         type=int,
-        default=int(os.getenv("TIBBER_OFFSET_HOURS", "0")),
+        default=defaults.offset_hours,
         help="Offset the end time backwards by N hours to avoid partial data.",
     )
     parser.add_argument(
         "--resume",
         action="store_true",
-        default=os.getenv("TIBBER_RESUME", "").lower() in {"1", "true", "yes"},
-        help="Resume from last loaded timestamp in destination.",
+        default=defaults.resume,
+        help=(
+            "Resume from last loaded timestamp in destination "
+            "(ignored when --start or --latest-hours is set). The timestamp is "
+            "cached in public.pipeline_watermark and re-derived from the data "
+            "when the cached row no longer exists."
+        ),
     )
     parser.add_argument(
         "--self-heal",
         action="store_true",
-        default=os.getenv("TIBBER_SELF_HEAL", "").lower() in {"1", "true", "yes"},
+        default=defaults.self_heal,
         help="After load, check for gaps in the window and retry once if any are found.",
     )
     parser.add_argument(
         "--start",
         type=str,
-        default=os.getenv("TIBBER_START"),
+        default=defaults.start,
         help="Start datetime (YYYY-MM-DD or ISO with timezone).",
     )
     parser.add_argument(
         "--end",
         type=str,
-        default=os.getenv("TIBBER_END"),
+        default=defaults.end,
         help="End datetime (YYYY-MM-DD or ISO with timezone). Defaults to now when --start is set.",
     )
     parser.add_argument(
         "--chunk-hours",
         type=int,
-        default=int(os.getenv("TIBBER_CHUNK_HOURS", "168")),
+        default=defaults.chunk_hours,
         help="Chunk size in hours for range pulls (default: 168).",
     )
+    parser.add_argument(
+        "--fetch-workers",
+        type=int,
+        default=defaults.fetch_workers,
+        help=(
+            "Range chunks fetched concurrently from Tibber "
+            f"(1-{MAX_FETCH_WORKERS}, default: 4)."
+        ),
+    )
     parser.add_argument(
         "--dataset",
         type=str,
-        default=os.getenv("DLT_DATASET", "raw"),
+        default=defaults.dataset,
         help="Destination dataset/schema (default: raw).",
     )
-    return parser.parse_args()
+    args = parser.parse_args()
+    if not 0 < args.fetch_workers <= MAX_FETCH_WORKERS:
+        parser.error(f"--fetch-workers must be between 1 and {MAX_FETCH_WORKERS}")
+    return args
+
+
+def _is_undefined_table(exc: Exception) -> bool:
+    from psycopg2 import errorcodes
+
+    return getattr(exc, "pgcode", None) == errorcodes.UNDEFINED_TABLE
 
 
 def _fetch_last_loaded(
     conn_str: str,
+    pipeline_name: str,
     dataset: str,
-    home_id: str,
-) -> str | None:
+    home_ids: Sequence[str],
+) -> dict[str, str]:
+    import psycopg2
+    from psycopg2 import sql
+
+    # A watermark is only trusted while its row still exists, so a truncated or
+    # reloaded consumption table falls back to max(from_time) below.
+    watermark_query = sql.SQL("""
+        select w.home_id, w.max_from_time
+        from public.pipeline_watermark w
+        where w.pipeline_name = %s
+          and w.dataset = %s
+          and w.home_id = any(%s)
+          and exists (
+              select 1
+              from {}.consumption c
+              where c.home_id = w.home_id
+                and c.from_time = w.max_from_time
+          )
+    """).format(sql.Identifier(dataset))
     query = sql.SQL(
-        "select max(from_time) from {}.consumption where home_id = %s"
+        "select home_id, max(from_time) from {}.consumption"
+        " where home_id = any(%s) group by home_id"
     ).format(sql.Identifier(dataset))
-    with psycopg2.connect(conn_str) as conn:
-        with conn.cursor() as cur:
-            cur.execute(query, (home_id,))
-            row = cur.fetchone()
-    if not row or row[0] is None:
-        return None
-    return row[0].isoformat()
+    loaded = {}
+    with _conn(conn_str) as conn, conn.cursor() as cur:
+        try:
+            cur.execute(watermark_query, (pipeline_name, dataset, list(home_ids)))
+            loaded.update(cur.fetchall())
+        except psycopg2.ProgrammingError as exc:
+            if not _is_undefined_table(exc):
+                raise
+        # Homes without a watermark yet (first run): fall back to the data.
+        missing = [home_id for home_id in home_ids if home_id not in loaded]
+        if missing:
+            cur.execute(query, (missing,))
+            loaded.update(cur.fetchall())
+    return {
+        home_id: value.isoformat()
+        for home_id, value in loaded.items()
+        if value is not None
+    }
 
 
-def _count_gaps_in_window(
+def _has_gaps_in_window(
     conn_str: str,
     dataset: str,
     home_id: str,
     start: str,
     end: str,
-) -> int:
+) -> bool:
+    # Anti-join on (home_id, from_time) instead of lag(): index probes, no sort.
+    # The first row in the window has no predecessor to compare against, and
+    # exists() stops at the first missing hour.
     query = f"""
-        with ordered as (
-            select from_time,
-                   lag(from_time) over (order by from_time) as prev_time
-            from {dataset}.consumption
-            where home_id = %s
-              and from_time >= %s
-              and from_time < %s
+        select exists (
+            select 1
+            from {dataset}.consumption c
+            where c.home_id = %(home_id)s
+              and c.from_time > (
+                  select min(from_time)
+                  from {dataset}.consumption
+                  where home_id = %(home_id)s
+                    and from_time >= %(start)s
+                    and from_time < %(end)s
+              )
+              and c.from_time < %(end)s
+              and not exists (
+                  select 1
+                  from {dataset}.consumption p
+                  where p.home_id = c.home_id
+                    and p.from_time = c.from_time - interval '1 hour'
+              )
         )
-        select count(*)
-        from ordered
-        where prev_time is not null
-          and from_time - prev_time > interval '1 hour'
     """
-    with psycopg2.connect(conn_str) as conn:
-        with conn.cursor() as cur:
-            cur.execute(query, (home_id, start, end))
-            return int(cur.fetchone()[0])
+    with _conn(conn_str) as conn, conn.cursor() as cur:
+        cur.execute(query, {"home_id": home_id, "start": start, "end": end})
+        return bool(cur.fetchone()[0])
+
+
+def _truncate_utf8(value: str, max_bytes: int) -> str:
+    return value.encode("utf-8")[:max_bytes].decode("utf-8", errors="ignore")
 
 
 def _write_status(
     conn_str: str,
-    pipeline_name: str,
-    status: str,
-    message: str | None,
-    rows_loaded: int | None,
+    rows: Sequence[tuple[str, str, str | None, int | None]],
+    watermark: tuple[str, str, str] | None = None,
 ) -> None:
+    import psycopg2.extensions
+    from psycopg2 import sql
+
+    # pipeline_status is keyed by pipeline_name and one upsert cannot touch the
+    # same row twice, so keep the last row per pipeline.
+    latest = {row[0]: row for row in rows}
+    status_rows = tuple(
+        (name, status, _truncate_utf8(message, 1000) if message else None, loaded)
+        for name, status, message, loaded in latest.values()
+    )
+    if not status_rows and watermark is None:
+        return
+
     create_sql = """
         create table if not exists public.pipeline_status (
             pipeline_name text primary key,
@@ -137,32 +343,92 @@ def _write_status(
             status text not null,
             message text,
             rows_loaded integer
+        );
+        create table if not exists public.pipeline_watermark (
+            pipeline_name text not null,
+            dataset text not null,
+            home_id text not null,
+            max_from_time timestamptz not null,
+            primary key (pipeline_name, dataset, home_id)
         )
     """
     upsert_sql = """
         insert into public.pipeline_status
             (pipeline_name, last_run_at, status, message, rows_loaded)
-        values
-            (%s, now(), %s, %s, %s)
+        values %s
         on conflict (pipeline_name) do update
             set last_run_at = excluded.last_run_at,
                 status = excluded.status,
                 message = excluded.message,
                 rows_loaded = excluded.rows_loaded
     """
-    msg = message[:1000] if message else None
+    # Only rows at or after the previous watermark need scanning, provided its
+    # row still exists; otherwise the full max() replaces a stale watermark.
+    watermark_sql = """
+        insert into public.pipeline_watermark
+            (pipeline_name, dataset, home_id, max_from_time)
+        select %(pipeline_name)s, %(dataset)s, %(home_id)s, max(c.from_time)
+        from {0}.consumption c
+        where c.home_id = %(home_id)s
+          and c.from_time >= coalesce(
+              (
+                  select w.max_from_time
+                  from public.pipeline_watermark w
+                  where w.pipeline_name = %(pipeline_name)s
+                    and w.dataset = %(dataset)s
+                    and w.home_id = %(home_id)s
+                    and exists (
+                        select 1
+                        from {0}.consumption p
+                        where p.home_id = w.home_id
+                          and p.from_time = w.max_from_time
+                    )
+              ),
+              '-infinity'
+          )
+        having max(c.from_time) is not null
+        on conflict (pipeline_name, dataset, home_id) do update
+            set max_from_time = excluded.max_from_time
+    """
+
+    def _execute(cur: psycopg2.extensions.cursor, statement: bytes) -> None:
+        # The DDL is only sent when the status tables do not exist yet.
+        try:
+            cur.execute(statement)
+        except psycopg2.ProgrammingError as exc:
+            if not _is_undefined_table(exc):
+                raise
+            cur.execute(b";".join([create_sql.encode(), statement]))
+
+    if status_rows:
+        try:
+            with _conn(conn_str) as conn, conn.cursor() as cur:
+                # Bind all rows client-side (as execute_values does) so they ship
+                # in one simple-query round-trip.
+                values = b",".join(
+                    cur.mogrify("(%s, now(), %s, %s, %s)", row) for row in status_rows
+                )
+                _execute(cur, upsert_sql.encode() % values)
+        except Exception as exc:  # best-effort status
+            print(f"Status write failed: {exc}")
+    if watermark is None:
+        return
+    # Kept apart from the status upsert so a watermark failure (e.g. a dataset
+    # with no consumption table yet) never loses the heartbeat row.
+    pipeline_name, dataset, home_id = watermark
+    query = sql.SQL(watermark_sql).format(sql.Identifier(dataset))
+    params = {"pipeline_name": pipeline_name, "dataset": dataset, "home_id": home_id}
     try:
-        with psycopg2.connect(conn_str) as conn:
-            with conn.cursor() as cur:
-                cur.execute(create_sql)
-                cur.execute(upsert_sql, (pipeline_name, status, msg, rows_loaded))
-    except Exception as exc:  # best-effort status
-        print(f"Status write failed: {exc}")
+        with _conn(conn_str) as conn, conn.cursor() as cur:
+            _execute(cur, cur.mogrify(query, params))
+    except Exception as exc:  # best-effort watermark
+        print(f"Watermark write failed: {exc}")
 
 
-def main() -> None:
-    load_dotenv()
-    args = parse_args()
+def _ingest(args: argparse.Namespace) -> None:
+    import dlt
+
+    from energy_forecast.data.tibber_source import tibber_source
 
     token = _env("TIBBER_TOKEN")
     home_id = _env("TIBBER_HOME_ID")
@@ -181,65 +447,72 @@ def main() -> None:
         start_dt = end_dt - timedelta(hours=args.latest_hours)
         start_override = start_dt.isoformat()
         end_override = end_dt.isoformat()
-    if args.resume:
-        last_loaded = _fetch_last_loaded(supabase_url, args.dataset, home_id)
+    # An explicit --start or --latest-hours window wins over --resume, which
+    # saves the last-loaded lookup on scheduled runs that pass both.
+    if args.resume and not start_override:
+        last_loaded = _fetch_last_loaded(
+            supabase_url, PIPELINE_NAME, args.dataset, [home_id]
+        ).get(home_id)
         if last_loaded:
             start_override = last_loaded
 
     pipeline = dlt.pipeline(
-        pipeline_name="tibber",
+        pipeline_name=PIPELINE_NAME,
         destination="postgres",
         dataset_name=args.dataset,
     )
+    # dlt sources are single-use generators, so the self-heal retry needs a fresh
+    # one; bind the arguments once and build each from the same partial.
+    make_source = partial(
+        tibber_source,
+        token=token,
+        home_id=home_id,
+        last_hours=args.last_hours,
+        start=start_override,
+        end=end_override,
+        chunk_hours=args.chunk_hours,
+        max_workers=args.fetch_workers,
+    )
     try:
-        source = tibber_source(
-            token=token,
-            home_id=home_id,
-            last_hours=args.last_hours,
-            start=start_override,
-            end=end_override,
-            chunk_hours=args.chunk_hours,
-        )
-        load_info = pipeline.run(source, write_disposition="merge")
+        load_info = pipeline.run(make_source(), write_disposition="merge")
         print(load_info)
 
         if args.self_heal and start_override and end_override:
-            gaps = _count_gaps_in_window(
+            if _has_gaps_in_window(
                 supabase_url,
                 args.dataset,
                 home_id,
                 start_override,
                 end_override,
-            )
-            if gaps > 0:
-                retry_source = tibber_source(
-                    token=token,
-                    home_id=home_id,
-                    last_hours=args.last_hours,
-                    start=start_override,
-                    end=end_override,
-                    chunk_hours=args.chunk_hours,
-                )
-                retry_info = pipeline.run(retry_source, write_disposition="merge")
+            ):
+                retry_info = pipeline.run(make_source(), write_disposition="merge")
                 print(retry_info)
 
         _write_status(
             supabase_url,
-            pipeline.pipeline_name,
-            "success",
-            str(load_info),
-            None,
+            [(pipeline.pipeline_name, "success", str(load_info), None)],
+            watermark=(pipeline.pipeline_name, args.dataset, home_id),
         )
     except Exception as exc:
         _write_status(
             supabase_url,
-            pipeline.pipeline_name,
-            "failed",
-            str(exc),
-            None,
+            [(pipeline.pipeline_name, "failed", str(exc), None)],
         )
         raise
 
 
+def main() -> None:
+    from dotenv import load_dotenv
+
+    load_dotenv()
+    args = parse_args()
+    # Fail before _ingest imports dlt, which takes about a second.
+    _validate_env()
+    try:
+        _ingest(args)
+    finally:
+        _close_pools()
+
+
 if __name__ == "__main__":
     main()
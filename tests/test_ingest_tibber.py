@@ -0,0 +1,93 @@
+from __future__ import annotations
+
+from contextlib import contextmanager
+from typing import Any, Iterator
+
+import pytest
+
+from energy_forecast.pipeline import ingest_tibber
+
+
+class _FakeCursor:
+    def __init__(self, statements: list[bytes]) -> None:
+        self.statements = statements
+
+    def __enter__(self) -> _FakeCursor:
+        return self
+
+    def __exit__(self, *exc: object) -> None:
+        pass
+
+    def mogrify(self, query: Any, params: Any) -> bytes:
+        if not isinstance(query, str):
+            return b"watermark upsert"
+        return (query % tuple(map(repr, params))).encode()
+
+    def execute(self, statement: bytes) -> None:
+        self.statements.append(statement)
+
+
+class _FakeConnection:
+    def __init__(self, statements: list[bytes]) -> None:
+        self.statements = statements
+
+    def cursor(self) -> _FakeCursor:
+        return _FakeCursor(self.statements)
+
+
+@pytest.fixture
+def statements(monkeypatch: pytest.MonkeyPatch) -> list[bytes]:
+    executed: list[bytes] = []
+
+    @contextmanager
+    def fake_conn(conn_str: str) -> Iterator[_FakeConnection]:
+        yield _FakeConnection(executed)
+
+    monkeypatch.setattr(ingest_tibber, "_conn", fake_conn)
+    return executed
+
+
+def test_truncate_utf8_keeps_whole_characters() -> None:
+    # The leading ASCII byte puts the 1000-byte cut inside an "é".
+    value = "a" + "é" * 600
+
+    truncated = ingest_tibber._truncate_utf8(value, 1000)
+
+    assert len(truncated.encode("utf-8")) <= 1000
+    assert value.startswith(truncated)
+    assert truncated == "a" + "é" * 499
+
+
+def test_truncate_utf8_leaves_short_values_alone() -> None:
+    assert ingest_tibber._truncate_utf8("all good", 1000) == "all good"
+
+
+def test_write_status_skips_empty_rows(
+    monkeypatch: pytest.MonkeyPatch,
+) -> None:
+    def fail_conn(conn_str: str) -> None:
+        raise AssertionError("no connection expected")
+
+    monkeypatch.setattr(ingest_tibber, "_conn", fail_conn)
+
+    ingest_tibber._write_status("postgresql://", [])
+
+
+def test_write_status_keeps_last_row_per_pipeline(statements: list[bytes]) -> None:
+    ingest_tibber._write_status(
+        "postgresql://",
+        [("tibber", "success", "first", None), ("tibber", "failed", "second", None)],
+    )
+
+    assert len(statements) == 1
+    assert statements[0].count(b"now()") == 1
+    assert b"'failed'" in statements[0]
+    assert b"'success'" not in statements[0]
+
+
+def test_write_status_sends_watermark_without_rows(statements: list[bytes]) -> None:
+    ingest_tibber._write_status(
+        "postgresql://", [], watermark=("tibber", "raw", "home")
+    )
+
+    assert statements == [b"watermark upsert"]
@@ -1,11 +1,16 @@
 from __future__ import annotations
 
+from dataclasses import dataclass
 import os
+from typing import NamedTuple
 
 import psycopg2
 import psycopg2.extensions
 import pytest
 
+if not os.getenv("SUPABASE_DATABASE_URL"):
+    pytest.skip("SUPABASE_DATABASE_URL not set", allow_module_level=True)
+
 
 def _env(name: str) -> str:
     value = os.getenv(name)
@@ -14,109 +19,130 @@ def _env(name: str) -> str:
     return value
 
 
+@dataclass(frozen=True)
+class Context:
+    conn_str: str
+    dataset: str
+    home_id: str
+
+
+@pytest.fixture(scope="session")
+def ctx() -> Context:
+    return Context(
+        conn_str=_env("SUPABASE_DATABASE_URL"),
+        dataset=os.getenv("DLT_DATASET", "raw"),
+        home_id=_env("TIBBER_HOME_ID"),
+    )
+
+
 @pytest.fixture(scope="session")
-def db_conn() -> psycopg2.extensions.connection:
-    conn_str = _env("SUPABASE_DATABASE_URL")
-    conn = psycopg2.connect(conn_str)
+def db_conn(ctx: Context) -> psycopg2.extensions.connection:
+    conn = psycopg2.connect(ctx.conn_str)
     try:
         yield conn
     finally:
         conn.close()
 
 
-def _dataset() -> str:
-    return os.getenv("DLT_DATASET", "raw")
-
-
-def _home_id() -> str:
-    return _env("TIBBER_HOME_ID")
+class DataQuality(NamedTuple):
+    min_ok: bool | None
+    max_ok: bool | None
+    gaps: int
+    gap_examples: list[list[str]] | None
+    dupes: int
 
 
-def test_consumption_coverage_2025_q4(db_conn: psycopg2.extensions.connection) -> None:
-    if not os.getenv("SUPABASE_DATABASE_URL"):
-        pytest.skip("SUPABASE_DATABASE_URL not set")
-    dataset = _dataset()
-    home_id = _home_id()
-    query = f"""
-        select
-            min(from_time) <= (timestamp '2024-09-01 00:00:00' at time zone 'Europe/Stockholm') as min_ok,
-            max(from_time) >= (timestamp '2026-01-31 23:00:00' at time zone 'Europe/Stockholm') as max_ok
-        from {dataset}.consumption
-        where home_id = %s
-    """
-    with db_conn.cursor() as cur:
-        cur.execute(query, (home_id,))
-        row = cur.fetchone()
-    assert row and row[0] is not None, "No data found in consumption table"
-    min_ok, max_ok = row
-    assert min_ok, "min_time is after 2024-09-01 00:00 Europe/Stockholm"
-    assert max_ok, "max_time is before 2026-01-31 23:00 Europe/Stockholm"
-
-
-def test_no_missing_hours_2025_q4(db_conn: psycopg2.extensions.connection) -> None:
-    if not os.getenv("SUPABASE_DATABASE_URL"):
-        pytest.skip("SUPABASE_DATABASE_URL not set")
-    dataset = _dataset()
-    home_id = _home_id()
+@pytest.fixture(scope="session")
+def dq_results(db_conn: psycopg2.extensions.connection, ctx: Context) -> DataQuality:
+    dataset = ctx.dataset
+    # All three checks in one statement: a single round-trip for the module.
+    # Gap rows are the first hour after a missing one; their predecessor is
+    # only looked up for those rows, so a clean window pays nothing extra.
     query = f"""
-        with ordered as (
-            select from_time,
-                   lag(from_time) over (order by from_time) as prev_time
-            from {dataset}.consumption
-            where home_id = %s
-              and from_time >= (timestamp '2024-09-01 00:00:00' at time zone 'Europe/Stockholm')
-              and from_time < (timestamp '2026-01-01 00:00:00' at time zone 'Europe/Stockholm')
+        with gap_rows as (
+            select c.from_time,
+                   (
+                       select max(p.from_time)
+                       from {dataset}.consumption p
+                       where p.home_id = c.home_id
+                         and p.from_time < c.from_time
+                   ) as prev_time
+            from {dataset}.consumption c
+            where c.home_id = %(home_id)s
+              and c.from_time > (
+                  select min(from_time)
+                  from {dataset}.consumption
+                  where home_id = %(home_id)s
+                    and from_time >= (timestamp '2024-09-01 00:00:00' at time zone 'Europe/Stockholm')
+                    and from_time < (timestamp '2026-01-01 00:00:00' at time zone 'Europe/Stockholm')
+              )
+              and c.from_time < (timestamp '2026-01-01 00:00:00' at time zone 'Europe/Stockholm')
+              and not exists (
+                  select 1
+                  from {dataset}.consumption p
+                  where p.home_id = c.home_id
+                    and p.from_time = c.from_time - interval '1 hour'
+              )
         )
-        select count(*)
-        from ordered
-        where prev_time is not null
-          and from_time - prev_time > interval '1 hour'
+        select coverage.min_ok, coverage.max_ok, gaps.total, gaps.examples,
+               duplicates.total
+        from (
+            select
+                min(from_time) <= (timestamp '2024-09-01 00:00:00' at time zone 'Europe/Stockholm') as min_ok,
+                max(from_time) >= (timestamp '2026-01-31 23:00:00' at time zone 'Europe/Stockholm') as max_ok
+            from {dataset}.consumption
+            where home_id = %(home_id)s
+        ) coverage,
+        (
+            select
+                count(*) as total,
+                (
+                    select jsonb_agg(
+                        jsonb_build_array(prev_time, from_time, gap) order by gap desc
+                    )
+                    from (
+                        select prev_time, from_time, from_time - prev_time as gap
+                        from gap_rows
+                        order by gap desc
+                        limit 5
+                    ) top
+                ) as examples
+            from gap_rows
+        ) gaps,
+        (
+            select count(*) as total
+            from (
+                select home_id, from_time, count(*)
+                from {dataset}.consumption
+                where home_id = %(home_id)s
+                group by home_id, from_time
+                having count(*) > 1
+            ) dupes
+        ) duplicates
     """
     with db_conn.cursor() as cur:
-        cur.execute(query, (home_id,))
-        gaps = cur.fetchone()[0]
+        cur.execute(query, {"home_id": ctx.home_id})
+        return DataQuality(*cur.fetchone())
+
+
+def test_consumption_coverage_2025_q4(dq_results: DataQuality) -> None:
+    assert dq_results.min_ok is not None, "No data found in consumption table"
+    assert dq_results.min_ok, "min_time is after 2024-09-01 00:00 Europe/Stockholm"
+    assert dq_results.max_ok, "max_time is before 2026-01-31 23:00 Europe/Stockholm"
+
+
+def test_no_missing_hours_2025_q4(dq_results: DataQuality) -> None:
+    gaps = dq_results.gaps
     if gaps:
-        details_query = f"""
-            with ordered as (
-                select from_time,
-                       lag(from_time) over (order by from_time) as prev_time
-                from {dataset}.consumption
-                where home_id = %s
-                  and from_time >= (timestamp '2024-09-01 00:00:00' at time zone 'Europe/Stockholm')
-                  and from_time < (timestamp '2026-01-01 00:00:00' at time zone 'Europe/Stockholm')
-            )
-            select prev_time, from_time, from_time - prev_time as gap
-            from ordered
-            where prev_time is not null
-              and from_time - prev_time > interval '1 hour'
-            order by gap desc
-            limit 5
-        """
-        with db_conn.cursor() as cur:
-            cur.execute(details_query, (home_id,))
-            rows = cur.fetchall()
-        formatted = "; ".join(f"{prev} -> {curr} ({gap})" for prev, curr, gap in rows)
+        formatted = "; ".join(
+            f"{prev} -> {curr} ({gap})"
+            for prev, curr, gap in dq_results.gap_examples or []
+        )
         pytest.fail(
             f"Found {gaps} gaps larger than 1 hour between 2024-09-01 and 2025-12-31. Examples: {formatted}"
         )
 
 
-def test_no_duplicate_entries(db_conn: psycopg2.extensions.connection) -> None:
-    if not os.getenv("SUPABASE_DATABASE_URL"):
-        pytest.skip("SUPABASE_DATABASE_URL not set")
-    dataset = _dataset()
-    home_id = _home_id()
-    query = f"""
-        select count(*)
-        from (
-            select home_id, from_time, count(*)
-            from {dataset}.consumption
-            where home_id = %s
-            group by home_id, from_time
-            having count(*) > 1
-        ) duplicates
-    """
-    with db_conn.cursor() as cur:
-        cur.execute(query, (home_id,))
-        dupes = cur.fetchone()[0]
+def test_no_duplicate_entries(dq_results: DataQuality) -> None:
+    dupes = dq_results.dupes
     assert dupes == 0, f"Found {dupes} duplicate (home_id, from_time) rows"
@@ -0,0 +1,63 @@
+from __future__ import annotations
+
+from datetime import datetime, timedelta, timezone
+import time
+
+import pytest
+
+from energy_forecast.data import MAX_FETCH_WORKERS, tibber_source
+
+
+def test_iter_consumption_chunks_keeps_cursor_order(
+    monkeypatch: pytest.MonkeyPatch,
+) -> None:
+    start = datetime(2025, 1, 1, tzinfo=timezone.utc)
+    range_end = start + timedelta(hours=8)
+    finished: list[datetime] = []
+
+    def fake_range(
+        token: str,
+        home_id: str,
+        start: datetime,
+        end: datetime,
+        resolution: str = "HOURLY",
+    ) -> list[dict]:
+        # Earlier chunks finish last.
+        time.sleep((range_end - start).total_seconds() / 3600 * 0.02)
+        finished.append(start)
+        hours = int((end - start).total_seconds() // 3600)
+        return [{"from_time": start + timedelta(hours=h)} for h in range(hours)]
+
+    monkeypatch.setattr(tibber_source, "fetch_consumption_range", fake_range)
+
+    rows = list(
+        tibber_source.iter_consumption_chunks(
+            token="token",
+            home_id="home",
+            start=start,
+            end=range_end,
+            chunk_hours=2,
+            max_workers=4,
+        )
+    )
+
+    assert finished != sorted(finished)
+    assert [row["from_time"] for row in rows] == [
+        start + timedelta(hours=h) for h in range(8)
+    ]
+
+
+@pytest.mark.parametrize("max_workers", [0, -1, MAX_FETCH_WORKERS + 1])
+def test_iter_consumption_chunks_rejects_max_workers(max_workers: int) -> None:
+    start = datetime(2025, 1, 1, tzinfo=timezone.utc)
+    with pytest.raises(ValueError):
+        list(
+            tibber_source.iter_consumption_chunks(
+                token="token",
+                home_id="home",
+                start=start,
+                end=start + timedelta(hours=4),
+                chunk_hours=2,
+                max_workers=max_workers,
+            )
+        )